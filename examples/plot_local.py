@@ -51,4 +51,4 @@ lpca = lid.lPCA().fit(X)
 
 # all datapoint neighborhoods
 pw_id = asPointwise(X, lid.FisherS(),
-                    n_neighbors=100, n_jobs=1)
+                    n_neighbors=100, n_jobs=-1)
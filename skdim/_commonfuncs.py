@@ -32,9 +32,9 @@
 import numpy as np
 import itertools
 import numbers
-import multiprocessing as mp
 from sklearn.utils.validation import check_random_state
 from sklearn.neighbors import NearestNeighbors
+from joblib import Parallel, delayed
 from scipy.special import gammainc
 from inspect import getmembers, isclass
 import skdim
@@ -126,20 +126,26 @@ def get_nn(X, k, n_jobs=1):
     return dists, inds
 
 
+def _fit_dimension(class_instance, X):
+    return class_instance.fit(X).dimension_
+
+
 def asPointwise(data, class_instance, precomputed_knn=None, n_neighbors=100, n_jobs=1):
-    """Use a global estimator as a pointwise one by creating kNN neighborhoods"""
+    """Use a global estimator as a pointwise one by creating kNN neighborhoods.
+    Neighborhoods are fitted in parallel with joblib when n_jobs > 1 or n_jobs < 0 (n_jobs=-1 uses
+    all processors). n_jobs=None or 1 fits them serially. precomputed_knn may hold neighborhoods of
+    different sizes (e.g. from radius_neighbors)"""
     if precomputed_knn is not None:
         knn = precomputed_knn
     else:
         _, knn = get_nn(data, k=n_neighbors, n_jobs=n_jobs)
 
-    if n_jobs > 1:
-        pool = mp.Pool(n_jobs)
-        results = pool.map(class_instance.fit, [data[i, :] for i in knn])
-        pool.close()
-        return [i.dimension_ for i in results]
-    else:
+    if n_jobs is None or n_jobs == 1:
         return [class_instance.fit(data[i, :]).dimension_ for i in knn]
+    else:
+        return Parallel(n_jobs=n_jobs)(
+            delayed(_fit_dimension)(class_instance, data[i, :]) for i in knn
+        )
 
 
 def mean_local_id(local_id, knnidx):
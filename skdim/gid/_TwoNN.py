@@ -39,6 +39,7 @@ from sklearn.base import BaseEstimator
 from sklearn.utils.validation import check_array
 
 import numpy as np
+import warnings
 from sklearn.metrics.pairwise import pairwise_distances_chunked
 from sklearn.linear_model import LinearRegression
 from .._commonfuncs import get_nn
@@ -59,12 +60,15 @@ class TwoNN(BaseEstimator):
     -----------
     Returns
 
-    d : int
+    dimension_ : float
         Intrinsic dimension of the dataset according to TWO-NN.
-    x : 1d array (optional)
-        Array with the -log(mu) values.
-    y : 1d array (optional)
-        Array with the -log(F(mu_{sigma(i)})) values.
+    x_ : 1d array
+        Array with the log(mu) values used for the linear fit.
+    y_ : 1d array
+        Array with the -log(1-F(mu_{sigma(i)})) values used for the linear fit.
+        The dimension is the slope of the fit through the origin, (x_ @ y_) / (x_ @ x_).
+    linear_fit_ : sklearn.linear_model.LinearRegression
+        Deprecated, use x_ and y_ instead.
 
     -----------
     References
@@ -97,12 +101,40 @@ class TwoNN(BaseEstimator):
         if not np.isfinite(X).all():
             raise ValueError("X contains inf or NaN")
 
-        self.dimension_, self.linear_fit_ = self._twonn(X)
+        self.dimension_, self.x_, self.y_ = self._twonn(X)
 
         self.is_fitted_ = True
         # `fit` should always return `self`
         return self
 
+    @property
+    def linear_fit_(self):
+        warnings.warn(
+            "linear_fit_ is deprecated and will be removed in a future version, "
+            "use x_ and y_ instead",
+            FutureWarning,
+            stacklevel=2,
+        )
+        return LinearRegression(fit_intercept=False).fit(self.x_[:, None], self.y_[:, None])
+
+    @staticmethod
+    def _three_smallest(D_chunk, start=None):
+        """Sorted 3 smallest values of each row of a distance matrix (chunk)"""
+        return np.sort(np.partition(D_chunk, 2, axis=1)[:, :3], axis=1)
+
+    @staticmethod
+    def _two_nn_dists(X):
+        """Distances of each point to its first and second nearest neighbors, computed by brute force"""
+        # center to limit the cancellation in |x|^2 + |y|^2 - 2<x,y> for data far from the origin
+        X = X - X.mean(axis=0)
+        sqnorms = np.einsum("ij,ij->i", X, X)
+        sqdists = sqnorms[:, None] + sqnorms[None, :] - 2 * X @ X.T
+        np.fill_diagonal(sqdists, np.inf)
+        nn = np.argpartition(sqdists, 1, axis=1)[:, :2]
+        # recompute the distances to the 2 selected neighbors from explicit differences
+        dists = np.sort(np.linalg.norm(X[nn] - X[:, None, :], axis=2), axis=1)
+        return dists[:, 0], dists[:, 1]
+
     def _twonn(self, X):
         """
         Calculates intrinsic dimension of the provided data points with the TWO-NN algorithm.
@@ -123,10 +155,10 @@ class TwoNN(BaseEstimator):
 
         d : int
             Intrinsic dimension of the dataset according to TWO-NN.
-        x : 1d array (optional)
-            Array with the -log(mu) values.
-        y : 1d array (optional)
-            Array with the -log(F(mu_{sigma(i)})) values.
+        x : 1d array
+            Array with the log(mu) values.
+        y : 1d array
+            Array with the -log(1-F(mu_{sigma(i)})) values.
 
         -----------
         References:
@@ -138,45 +170,48 @@ class TwoNN(BaseEstimator):
         N = len(X)
 
         if self.dist:
-            r1, r2 = dists[:, 0], dists[:, 1]
+            dists = self._three_smallest(X)
+            r1, r2 = dists[:, 1], dists[:, 2]
             _mu = r2/r1
-            # discard the largest distances
-            mu = _mu[np.argsort(
-                _mu)[:int(N*(1-self.discard_fraction))]]
 
         else:
             # mu = r2/r1 for each data point
             # relatively high dimensional data, use distance matrix generator
             if X.shape[1] > 25:
-                distmat_chunks = pairwise_distances_chunked(X)
-                _mu = np.zeros((len(X)))
-                i = 0
-                for x in distmat_chunks:
-                    x = np.sort(x, axis=1)
-                    r1, r2 = x[:, 1], x[:, 2]
-                    _mu[i:i+len(x)] = (r2/r1)
-                    i += len(x)
-
-                # discard the largest distances
-                mu = _mu[np.argsort(
-                    _mu)[:int(N*(1-self.discard_fraction))]]
+                # each chunk is reduced to its 3 smallest distances (self, 1st and 2nd NN)
+                # as soon as it is computed
+                dists = np.vstack(list(pairwise_distances_chunked(
+                    X, reduce_func=self._three_smallest)))
+                r1, r2 = dists[:, 1], dists[:, 2]
+                _mu = r2/r1
+
+            # small datasets (e.g. kNN neighborhoods), brute force with a single matrix
+            # product is faster than a tree search. The crossover grows with dimension
+            elif N <= 50 * X.shape[1]:
+                r1, r2 = self._two_nn_dists(X)
+                _mu = r2/r1
 
             else:  # relatively low dimensional data, search nearest neighbors directly
                 dists, _ = get_nn(X, k=2)
                 r1, r2 = dists[:, 0], dists[:, 1]
                 _mu = r2/r1
-                # discard the largest distances
-                mu = _mu[np.argsort(
-                    _mu)[:int(N*(1-self.discard_fraction))]]
 
-        # Empirical cumulate
-        Femp = np.arange(int(N*(1-self.discard_fraction)))/N
+        # discard the largest distances: partition then only sort the kept values.
+        # _mu is a fresh array, so it is partitioned, sorted and transformed in place
+        n_kept = int(N*(1-self.discard_fraction))
+        _mu.partition(n_kept-1)
+        mu = _mu[:n_kept]
+        mu.sort()
 
-        # Fit line
-        lr = LinearRegression(fit_intercept=False)
-        lr.fit(np.log(mu).reshape(-1, 1), -
-               np.log(1-Femp).reshape(-1, 1))
+        # Empirical cumulate
+        Femp = np.arange(n_kept, dtype=float)
+        Femp /= N
 
-        d = lr.coef_[0][0]  # extract slope
+        # Fit line through the origin, the slope is the dimension
+        x = np.log(mu, out=mu)
+        y = np.negative(Femp, out=Femp)
+        np.log1p(y, out=y)
+        np.negative(y, out=y)
+        d = (x @ y) / (x @ x)
 
-        return d, lr
+        return d, x, y
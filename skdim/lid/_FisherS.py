@@ -34,13 +34,9 @@ from sklearn.utils.validation import check_array
 
 import numba as nb
 import numpy as np
-import sklearn.decomposition as sk
 from scipy.special import lambertw
-from matplotlib import pyplot as plt
 import warnings
 
-warnings.filterwarnings("ignore")
-
 
 class FisherS(BaseEstimator):
     """
@@ -63,6 +59,11 @@ class FisherS(BaseEstimator):
         Whether to print number of retained principal components
     limit_maxdim : bool
         Whether to cap estimated maxdim to the embedding dimension
+    max_block_bytes : int or float, default=2**22
+        Constructor option, like the ones above. Memory budget in bytes of each block
+        of inner products computed when checking separability. All inner products are
+        computed at once when they fit. Larger blocks are slower since binning them no
+        longer benefits from the cache
 
     -----------
     Returns
@@ -89,6 +90,7 @@ class FisherS(BaseEstimator):
         produce_plots=False,
         verbose=0,
         limit_maxdim=False,
+        max_block_bytes=2 ** 22,
     ):
 
         self.conditional_number = conditional_number
@@ -97,6 +99,7 @@ class FisherS(BaseEstimator):
         self.produce_plots = produce_plots
         self.verbose = verbose
         self.limit_maxdim = limit_maxdim
+        self.max_block_bytes = max_block_bytes
 
     def fit(self, X, y=None):
         """A reference implementation of a fitting function.
@@ -124,28 +127,37 @@ class FisherS(BaseEstimator):
         if self.alphas is None:
             self._alphas = np.arange(0.6, 1, 0.02)[None]
 
-        (
-            self.n_alpha_,
-            self.dimension_,
-            self.p_alpha_,
-            self.alphas_,
-            self.separable_fraction_,
-            self.Xp_,
-        ) = self._SeparabilityAnalysis(X)
+        # warnings are silenced for the analysis only, not for the whole process
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore")
+            (
+                self.n_alpha_,
+                self.dimension_,
+                self.p_alpha_,
+                self.alphas_,
+                self.separable_fraction_,
+                self.Xp_,
+            ) = self._SeparabilityAnalysis(X)
 
         self.is_fitted_ = True
         # `fit` should always return `self`
         return self
 
     @staticmethod
-    @nb.njit
-    def _histc(X, bins):
-        map_to_bins = np.digitize(X, bins)
-        r = np.zeros((len(X[0, :]), len(bins)))
-        for j in range(len(map_to_bins[0, :])):
-            for i in map_to_bins[:, j]:
-                r[j, i - 1] += 1
-        return r
+    @nb.njit(parallel=True)
+    def _histc_rows(X, bins, counts):
+        """Add to counts[i] the number of values of row X[i] falling in each bin"""
+        for i in nb.prange(X.shape[0]):
+            for j in range(X.shape[1]):
+                counts[i, np.searchsorted(bins, X[i, j], side="right") - 1] += 1
+
+    @staticmethod
+    @nb.njit(parallel=True)
+    def _histc_cols(X, bins, counts):
+        """Add to counts[j] the number of values of column X[:, j] falling in each bin"""
+        for j in nb.prange(X.shape[1]):
+            for i in range(X.shape[0]):
+                counts[j, np.searchsorted(bins, X[i, j], side="right") - 1] += 1
 
     def _preprocessing(self, X, center, dimred, whiten):
         """
@@ -166,7 +178,7 @@ class FisherS(BaseEstimator):
         %           conditional_number Default value is 10. 
         %
         %Outputs:
-        %   X is preprocessed data matrix."""
+        %   X is preprocessed data matrix, C-contiguous."""
 
         # centering
         sampleMean = np.mean(X, axis=0)
@@ -174,13 +186,26 @@ class FisherS(BaseEstimator):
             X = X - sampleMean
         # dimensionality reduction if requested dimensionality reduction or whitening
         if dimred or whiten:
-            pca = sk.PCA()
-            u = pca.fit_transform(X)
-            v = pca.components_.T
-            s = pca.explained_variance_
+            Xc = X if center else X - sampleMean
+            n, d = Xc.shape
+            if n >= d:
+                # principal axes from the eigendecomposition of the (d, d) covariance
+                s, v = np.linalg.eigh(Xc.T @ Xc / (n - 1))
+            else:
+                # wide data: eigendecomposition of the (n, n) Gram matrix, which has the
+                # same nonzero eigenvalues as the covariance
+                s, u = np.linalg.eigh(Xc @ Xc.T / (n - 1))
+            # eigh returns eigenvalues in ascending order
+            s = s[::-1]
             sc = s / s[0]
             ind = np.where(sc > 1 / self.conditional_number)[0]
-            X = X @ v[:, ind]
+            if n >= d:
+                v = v[:, ::-1][:, ind]
+            else:
+                # principal axes recovered from the Gram eigenvectors
+                v = Xc.T @ (u[:, ::-1][:, ind] / np.sqrt(s[ind] * (n - 1)))
+            # whitening uses the (centered) principal component scores
+            X = (Xc if whiten else X) @ v
             if self.verbose:
                 print(
                     "%i components are retained using conditional_number=%2.2f"
@@ -189,16 +214,16 @@ class FisherS(BaseEstimator):
 
         # whitening
         if whiten:
-            X = u[:, ind]
-            st = np.std(X, axis=0, ddof=1)
-            X = X / st
+            # divide the scores by their standard deviation
+            X /= np.sqrt(s[ind])
         # #project on sphere (scale each vector to unit length)
         if self.project_on_sphere:
             st = np.sqrt(np.sum(X ** 2, axis=1))
             st = np.array([st]).T
             X = X / st
 
-        return X
+        # A contiguous layout lets BLAS use its fastest kernels
+        return np.ascontiguousarray(X)
 
     @staticmethod
     def _probability_inseparable_sphere(alphas, n):
@@ -244,9 +269,6 @@ class FisherS(BaseEstimator):
         %   py is n-by-m matrix. py(i,j) is fraction of points which are
         %       inseparable from point data(i, :) for alphas(j)."""
 
-        # Number of points per 1 loop. 20k assumes approx 3.2GB
-        nP = 2000
-
         alphas = self._alphas
         # Normalize alphas
         if len(alphas[:, 0]) > 1:
@@ -259,34 +281,32 @@ class FisherS(BaseEstimator):
         alphas = np.concatenate([[float("-inf")], alphas[0, :], [float("inf")]])
 
         n = len(data)
+        # Number of points per 1 loop, the loop starting at point k holds a
+        # (nP, n - k) block of inner products of at most max_block_bytes
+        nP = max(1, int(self.max_block_bytes // (data.itemsize * n)))
+
         counts = np.zeros((n, len(alphas)))
-        leng = np.zeros((n, 1))
+        if not self.project_on_sphere:
+            leng = np.einsum("ij,ij->i", data, data)[:, None]
         for k in range(0, n, nP):
-            # print('Chunk +{}'.format(k))
-            e = k + nP
-            if e > n:
-                e = n
-            # Calculate diagonal part, divide each row by diagonal element
-            xy = data[k:e, :] @ data[k:e, :].T
-            leng[k:e] = np.diag(xy)[:, None]
-            xy = xy - np.diag(leng[k:e].squeeze())
-            xy = xy / leng[k:e]
-            counts[k:e, :] = counts[k:e, :] + self._histc(xy.T, alphas)
-            # Calculate nondiagonal part
-            for kk in range(0, n, nP):
-                # Ignore diagonal part
-                if k == kk:
-                    continue
-                ee = kk + nP
-                if ee > n:
-                    ee = n
-
-                xy = data[k:e, :] @ data[kk:ee, :].T
-                xy = xy / leng[k:e]
-                counts[k:e, :] = counts[k:e, :] + self._histc(xy.T, alphas)
-
-        # Calculate cumulative sum
-        counts = np.cumsum(counts[:, ::-1], axis=1)[:, ::-1]
+            e = min(k + nP, n)
+            # Inner products of the chunk with itself and all following points, ignoring
+            # the point itself. Products with preceding points were computed by previous
+            # chunks and are counted there through the transposed part
+            xy = data[k:e, :] @ data[k:, :].T
+            xy[np.arange(e - k), np.arange(e - k)] = 0
+            xy_following = xy[:, e - k :]
+            # divide each row (and each column of the transposed part) by diagonal
+            # element, which is 1 for points on the unit sphere
+            if not self.project_on_sphere:
+                xy_following = xy_following / leng[e:].T
+                xy /= leng[k:e]
+            # each thread writes to the counts of its own points
+            self._histc_rows(xy, alphas, counts[k:e, :])
+            self._histc_cols(xy_following, alphas, counts[e:, :])
+
+        # Calculate reversed cumulative sum, in place
+        np.cumsum(counts[:, ::-1], axis=1, out=counts[:, ::-1])
 
         # print(counts)
 
@@ -301,6 +321,22 @@ class FisherS(BaseEstimator):
 
         return separ_fraction, py
 
+    @staticmethod
+    def _dimension_from_inseparability(py, alphas):
+        """
+        %Invert the probability of inseparability on the uniformly sampled
+        %n-sphere, giving the dimension for each pair (py[i], alphas[i]).
+        %Entries where py is 0 (all points are separable) are set to nan."""
+        n = np.full(len(py), np.nan)
+        inseparable = py != 0
+        p = py[inseparable]
+        a2 = alphas[inseparable] ** 2
+        w = np.log1p(-a2)
+        n[inseparable] = np.real(lambertw(-(w / (2 * np.pi * p * p * a2 * (1 - a2))))) / (
+            -w
+        )
+        return n
+
     def _dimension_uniform_sphere(self, py):
         """
         %Gives an estimation of the dimension of uniformly sampled n-sphere
@@ -333,18 +369,7 @@ class FisherS(BaseEstimator):
             )
 
         # Calculate dimension for each alpha
-        n = np.zeros((len(self._alphas[0, :])))
-        for i in range(len(self._alphas[0, :])):
-            if py[i] == 0:
-                # All points are separable. Nothing to do and not interesting
-                n[i] = np.nan
-            else:
-                p = py[i]
-                a2 = self._alphas[0, i] ** 2
-                w = np.log(1 - a2)
-                n[i] = np.real(lambertw(-(w / (2 * np.pi * p * p * a2 * (1 - a2))))) / (
-                    -w
-                )
+        n = self._dimension_from_inseparability(py, self._alphas[0, :])
 
         n[n == np.inf] = float("nan")
         # Find indices of alphas which are not completely separable
@@ -357,10 +382,13 @@ class FisherS(BaseEstimator):
         alpha_max = max(self._alphas[0, inds])
         # The reference alpha is the closest to 90 of maximal partially separable alpha
         alpha_ref = alpha_max * 0.9
-        k = np.where(
-            abs(self._alphas[0, inds] - alpha_ref)
-            == min(abs(self._alphas[0, :] - alpha_ref))
-        )[0]
+        dist_ref = np.abs(self._alphas[0, inds] - alpha_ref)
+        k = np.where(dist_ref == dist_ref.min())[0]
+        if len(k) > 1:
+            print(
+                "FisherS selected several dimensions as equally probable. Taking the maximum"
+            )
+            k = k[[np.argmax(n[inds[k]])]]
         # Get corresponding values
         alfa_single_estimate = self._alphas[0, inds[k]]
         n_single_estimate = n[inds[k]]
@@ -457,18 +485,9 @@ class FisherS(BaseEstimator):
             )
 
         # Calculate dimension for each alpha
-        n = np.zeros((len(_alphas[0, :])))
-        for i in range(len(_alphas[0, :])):
-            if py[i] == 0:
-                # All points are separable. Nothing to do and not interesting
-                n[i] = np.nan
-            else:
-                p = py[i]
-                a2 = _alphas[0, i] ** 2
-                w = np.log(1 - a2)
-                n[i] = np.real(lambertw(-(w / (2 * np.pi * p * p * a2 * (1 - a2))))) / (
-                    -w
-                )
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore")
+            n = self._dimension_from_inseparability(py, _alphas[0, :])
 
         n[n == np.inf] = float("nan")
 
@@ -500,6 +519,8 @@ class FisherS(BaseEstimator):
 
     @staticmethod
     def plotSeparabilityGraph(x, y, edges, alpha=0.3):
+        from matplotlib import pyplot as plt
+
         for i in range(len(edges)):
             ii = edges[i][0]
             jj = edges[i][1]
@@ -630,8 +651,11 @@ class FisherS(BaseEstimator):
         npoints = len(X[:, 0])
         # Preprocess data
         Xp = self._preprocessing(X, 1, 1, 1)
-        # Check separability
-        separable_fraction, p_alpha = self._checkSeparabilityMultipleAlpha(Xp)
+        # Check separability. Single precision is ample to compare inner products
+        # to alphas and halves the memory traffic of the (n, n) inner products
+        separable_fraction, p_alpha = self._checkSeparabilityMultipleAlpha(
+            Xp.astype(np.float32)
+        )
         # Calculate mean fraction of separable points for each alpha.
         py_mean = np.mean(p_alpha, axis=1)
         n_alpha, n_single, alpha_single = self._dimension_uniform_sphere(py_mean)
@@ -642,6 +666,8 @@ class FisherS(BaseEstimator):
             n_single = np.clip(n_single, None, X.shape[1])
 
         if self.produce_plots:
+            from matplotlib import pyplot as plt
+
             # Define the minimal and maximal dimensions for theoretical graph with
             # two dimensions in each side
             n_min = np.floor(min(n_alpha)) - 2
@@ -675,12 +701,7 @@ class FisherS(BaseEstimator):
 
             plt.figure()
             plt.xticks(locs, labels)
-            pteor = np.zeros((len(ns), len(self._alphas[0, :])))
-            for k in range(len(ns)):
-                for j in range(len(self._alphas[0, :])):
-                    pteor[k, j] = self._probability_inseparable_sphere(
-                        self._alphas[0, j], ns[k]
-                    )
+            pteor = self._probability_inseparable_sphere(self._alphas, ns[:, None])
 
             for i in range(len(pteor[:, 0])):
                 plt.semilogy(self._alphas[0, :], pteor[i, :], "-", color="r")
@@ -701,9 +722,4 @@ class FisherS(BaseEstimator):
             plt.title("Theor.curves for n=%i:%i" % (n_min, n_max))
             plt.show()
 
-        if len(n_single) > 1:
-            print(
-                "FisherS selected several dimensions as equally probable. Taking the maximum"
-            )
-
         return n_alpha, n_single.max(), p_alpha, self._alphas, separable_fraction, Xp
@@ -78,7 +78,19 @@ def test_fisher_params(data,monkeypatch):
     x = skdim.lid.FisherS(project_on_sphere=False).fit(data)
     x = skdim.lid.FisherS(verbose=True).fit(data)
     x = skdim.lid.FisherS(limit_maxdim=True).fit(data)
+    x = skdim.lid.FisherS().fit(data)
+    assert x.Xp_.dtype == np.float64 and x.Xp_.flags.c_contiguous
+    x = skdim.lid.FisherS(max_block_bytes=1).fit(data)
+    assert np.array_equal(x.p_alpha_, skdim.lid.FisherS().fit(data).p_alpha_)
+    x = skdim.lid.FisherS(max_block_bytes=1e4).fit(data)
+    assert np.array_equal(x.p_alpha_, skdim.lid.FisherS().fit(data).p_alpha_)
     x = skdim.lid.FisherS().fit(data).point_inseparability_to_pointID()
+    #alpha_ref = 0.9*0.7 = 0.63 is equally close to 0.62 and 0.64, the largest dimension is kept
+    x = skdim.lid.FisherS()
+    x._alphas = np.array([[0.6, 0.62, 0.64, 0.7]])
+    n, n_single, alpha_single = x._dimension_uniform_sphere(np.array([0.3, 0.05, 0.2, 0.1]))
+    assert n[1] > n[2]
+    assert len(n_single) == 1 and n_single[0] == n[1] and alpha_single[0] == 0.62
 
 def test_mind_ml_params(data):
     x = skdim.gid.MiND_ML()
@@ -163,6 +175,19 @@ def test_aspointwise(data):
     x = skdim.asPointwise(data,skdim.lid.lPCA(),n_neighbors=50)
     x = skdim.asPointwise(data,skdim.lid.lPCA(),n_neighbors=50,n_jobs=2)
     assert len(x) == len(data)
+    y = skdim.asPointwise(data,skdim.lid.lPCA(),n_neighbors=50,n_jobs=-1)
+    assert x == y
+    y = skdim.asPointwise(data,skdim.lid.lPCA(),n_neighbors=50,n_jobs=None)
+    assert x == y
+
+def test_aspointwise_ragged_knn(data):
+    from sklearn.neighbors import NearestNeighbors
+    knn = NearestNeighbors(radius=1.).fit(data).radius_neighbors(return_distance=False)
+    knn = [np.append(i, j) for j, i in enumerate(knn)]
+    assert len(set(len(i) for i in knn)) > 1
+    x = skdim.asPointwise(data,skdim.lid.lPCA(),precomputed_knn=knn,n_jobs=1)
+    y = skdim.asPointwise(data,skdim.lid.lPCA(),precomputed_knn=knn,n_jobs=2)
+    assert x == y
 
 
 def test_gendata():
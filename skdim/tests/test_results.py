@@ -174,3 +174,43 @@ def test_twonn_results(data):
     test_high_dim[:,:data.shape[1]] = data
     assert all((np.round(skdim.gid.TwoNN().fit(test_high_dim).dimension_,5) == 4.05496,
                 np.round(skdim.gid.TwoNN(discard_fraction=0.05).fit(data).dimension_,5) == 4.11323))
+
+def test_twonn_linear_fit_results(data):
+    x = skdim.gid.TwoNN().fit(data)
+    assert np.isclose((x.x_ @ x.y_) / (x.x_ @ x.x_), x.dimension_)
+    with pytest.warns(FutureWarning):
+        assert np.isclose(x.linear_fit_.coef_[0][0], x.dimension_)
+    #the warning must also reach users under the default filters, after importing all of skdim
+    import os, subprocess, sys
+    code = ("import numpy as np, skdim; X = np.random.RandomState(0).rand(100,5); "
+            "skdim.lid.FisherS().fit(X); skdim.gid.TwoNN().fit(X).linear_fit_")
+    stderr = subprocess.run([sys.executable, "-W", "default", "-c", code],
+                            capture_output=True, text=True,
+                            cwd=os.path.dirname(os.path.dirname(skdim.__file__))).stderr
+    assert "FutureWarning: linear_fit_ is deprecated" in stderr
+
+def test_twonn_dist_results(data):
+    from sklearn.metrics import pairwise_distances
+    assert np.isclose(skdim.gid.TwoNN(dist=True).fit(pairwise_distances(data)).dimension_,
+                      skdim.gid.TwoNN().fit(data).dimension_)
+
+def test_twonn_bruteforce_results():
+    #small data uses the brute force branch, compare it to the get_nn branch far from the origin
+    X = check_random_state(0).randn(120,3)*1e-2
+    for offset in [0, 1e3, 1e5, 1e6]:
+        r1, r2 = skdim.gid.TwoNN._two_nn_dists(X+offset)
+        dists, _ = skdim.get_nn(X+offset, k=2)
+        assert np.allclose(r1, dists[:,0]) and np.allclose(r2, dists[:,1])
+        assert np.isclose(skdim.gid.TwoNN().fit(X+offset).dimension_, 4.2865716)
+
+def test_fisher_preprocessing_wide_results():
+    #d > n uses the (n, n) Gram matrix, compare to whitened sklearn PCA scores projected on the sphere
+    from sklearn.decomposition import PCA
+    X = check_random_state(0).randn(40,500)
+    Xp = skdim.lid.FisherS()._preprocessing(X, 1, 1, 1)
+    pca = PCA().fit(X)
+    ind = pca.explained_variance_/pca.explained_variance_[0] > 1/10
+    ref = pca.transform(X)[:,ind]/np.sqrt(pca.explained_variance_[ind])
+    ref /= np.linalg.norm(ref, axis=1)[:,None]
+    assert Xp.shape == ref.shape
+    assert np.allclose(Xp @ Xp.T, ref @ ref.T, atol=1e-5)